@@ -51,12 +51,18 @@ def initialize_database():
             from models.file import File
             from models.message import Message
             from models.chat_room import ChatRoom
+            from models.storage_usage import StorageUsage
             
             # Create tables
             print("Creating database tables...")
             database.create_all()
             print("✓ Database tables created successfully!")
             
+            # Create full-text search indexes
+            from utils.search import create_search_indexes
+            create_search_indexes(database)
+            print("✓ Search indexes created successfully!")
+            
             # Initialize sample data
             from utils.database import init_db
             init_db(database, User)
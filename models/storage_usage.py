@@ -0,0 +1,12 @@
+from database import db
+from datetime import datetime
+
+class StorageUsage(db.Model):
+    __tablename__ = 'storage_usage'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    bytes_used = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<StorageUsage {self.user_id}: {self.bytes_used}>'
@@ -0,0 +1,46 @@
+import os
+import sys
+
+import pytest
+from flask import Flask
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import db, init_app  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    """Flask app backed by an in-memory SQLite database"""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    init_app(app)
+
+    from models.user import User  # noqa: F401
+    from models.file import File  # noqa: F401
+    from models.message import Message  # noqa: F401
+    from models.chat_room import ChatRoom  # noqa: F401
+    from models.storage_usage import StorageUsage  # noqa: F401
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def make_user(name, role):
+    from models.user import User
+
+    user = User(
+        name=name,
+        email=f'{name.lower()}@example.com',
+        password_hash='x',
+        role=role,
+        private_key='private',
+        public_key='public'
+    )
+    db.session.add(user)
+    db.session.flush()
+    return user
@@ -0,0 +1,109 @@
+import io
+import json
+import os
+import zipfile
+
+import pytest
+
+from database import db
+from models.chat_room import ChatRoom
+from models.file import File
+from models.message import Message
+from utils.encryption import RSAEncryption, sign_message, verify_signature
+from utils.export import stream_chat_export
+from tests.conftest import make_user
+
+
+@pytest.fixture(scope='module')
+def key_pairs():
+    rsa_encryption = RSAEncryption()
+    return [rsa_encryption.generate_key_pair() for _ in range(2)]
+
+
+@pytest.fixture
+def room(app, key_pairs, tmp_path):
+    lawyer = make_user('Lawyer', 'lawyer')
+    client = make_user('Client', 'client')
+    (lawyer.private_key, lawyer.public_key), (client.private_key, client.public_key) = key_pairs
+
+    chat_room = ChatRoom(lawyer_id=lawyer.id, client_id=client.id)
+    db.session.add(chat_room)
+    db.session.flush()
+
+    content = 'Signed engagement letter attached'
+    db.session.add(Message(chat_room_id=chat_room.id, sender_id=lawyer.id, content=content,
+                           signature=sign_message(content, lawyer.private_key)))
+
+    plain_path = tmp_path / 'letter.pdf'
+    plain_path.write_bytes(b'%PDF' + os.urandom(1000))
+    encrypted_path = RSAEncryption().encrypt_file(str(plain_path), client.public_key)
+    db.session.add(File(id='good', filename='letter.pdf', file_path=encrypted_path,
+                        file_size=os.path.getsize(encrypted_path),
+                        sender_id=lawyer.id, recipient_id=client.id))
+    db.session.commit()
+    return {'room': chat_room, 'lawyer': lawyer, 'client': client,
+            'plaintext': plain_path.read_bytes(), 'tmp_path': tmp_path}
+
+
+def _export(chat_room, rewrap_for=None):
+    data = b''.join(stream_chat_export(chat_room, Message, File, rewrap_for))
+    return zipfile.ZipFile(io.BytesIO(data))
+
+
+def test_export_contains_verifiable_messages_and_files(room):
+    archive = _export(room['room'])
+    assert archive.testzip() is None
+
+    keys = json.loads(archive.read('public_keys.json'))
+    record = json.loads(archive.read('messages.jsonl').splitlines()[0])
+    assert verify_signature(record['content'], record['signature'], keys[str(record['sender_id'])]['public_key'])
+
+    manifest = json.loads(archive.read('manifest.json'))
+    assert manifest['message_count'] == 1
+    assert archive.read(manifest['files'][0]['path']) == room['plaintext']
+
+
+def _add_undecryptable_file(room):
+    # Encrypted for the lawyer, but exported with the recipient's (client's) key
+    bad_plain = room['tmp_path'] / 'bad.pdf'
+    bad_plain.write_bytes(b'secret')
+    bad_path = RSAEncryption().encrypt_file(str(bad_plain), room['lawyer'].public_key)
+    db.session.add(File(id='bad', filename='bad.pdf', file_path=bad_path, file_size=1,
+                        sender_id=room['lawyer'].id, recipient_id=room['client'].id))
+    db.session.commit()
+
+
+def test_export_skips_undecryptable_file(room):
+    _add_undecryptable_file(room)
+
+    archive = _export(room['room'])
+    assert archive.testzip() is None
+
+    files = {f['id']: f for f in json.loads(archive.read('manifest.json'))['files']}
+    assert 'error' in files['bad'] and 'path' not in files['bad']
+    assert archive.read(files['good']['path']) == room['plaintext']
+
+
+def test_rewrap_export_skips_undecryptable_file(room):
+    _add_undecryptable_file(room)
+
+    archive = _export(room['room'], rewrap_for=room['lawyer'])
+    assert archive.testzip() is None
+    assert not any(name.startswith('files/bad_') for name in archive.namelist())
+
+    files = {f['id']: f for f in json.loads(archive.read('manifest.json'))['files']}
+    assert 'error' in files['bad'] and 'path' not in files['bad']
+
+    # The rewrapped file opens with the new owner's key
+    rewrapped_path = room['tmp_path'] / 'rewrapped.encrypted'
+    rewrapped_path.write_bytes(archive.read(files['good']['path']))
+    decrypted_path = RSAEncryption().decrypt_file(str(rewrapped_path), room['lawyer'].private_key)
+    with open(decrypted_path, 'rb') as f:
+        assert f.read() == room['plaintext']
+
+
+def test_decrypt_file_with_wrong_key_leaves_no_output(room):
+    file_record = db.session.get(File, 'good')
+    with pytest.raises(ValueError):
+        RSAEncryption().decrypt_file(file_record.file_path, room['lawyer'].private_key)
+    assert not os.path.exists(file_record.file_path.replace('.encrypted', '.decrypted'))
@@ -0,0 +1,131 @@
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+from database import db
+from models.file import File
+from models.storage_usage import StorageUsage
+from utils.janitor import MIN_MISSING_ROWS_TO_ABORT, run_janitor
+from utils.storage import get_storage_used
+from tests.conftest import make_user
+
+OLD = datetime.utcnow() - timedelta(days=2)
+
+
+@pytest.fixture
+def storage(app, tmp_path, monkeypatch):
+    """An app root with an uploads folder holding one live encrypted file"""
+    root = tmp_path / 'app'
+    uploads = root / 'uploads'
+    uploads.mkdir(parents=True)
+    sender = make_user('Lawyer', 'lawyer')
+    recipient = make_user('Client', 'client')
+
+    (uploads / 'live.encrypted').write_bytes(b'x' * 100)
+    db.session.add(File(id='live', filename='live.pdf', file_path='uploads/live.encrypted', file_size=100,
+                        sender_id=sender.id, recipient_id=recipient.id, created_at=OLD))
+    db.session.add(StorageUsage(user_id=sender.id, bytes_used=100))
+    db.session.commit()
+
+    # Relative paths must not depend on where the janitor is started from
+    elsewhere = tmp_path / 'elsewhere'
+    elsewhere.mkdir()
+    monkeypatch.chdir(elsewhere)
+    return {'root': str(root), 'uploads': uploads, 'sender': sender, 'recipient': recipient}
+
+
+def _age(path):
+    old = OLD.timestamp()
+    os.utime(path, (old, old))
+
+
+def _add_row(storage, file_id, created_at=OLD):
+    db.session.add(File(id=file_id, filename=f'{file_id}.pdf', file_path=f'uploads/{file_id}.encrypted',
+                        file_size=50, sender_id=storage['sender'].id,
+                        recipient_id=storage['recipient'].id, created_at=created_at))
+    db.session.commit()
+
+
+def test_removes_stale_temp_and_orphaned_files(storage):
+    uploads = storage['uploads']
+    for name in ('live.decrypted', 'abc_plain.pdf', 'fresh.decrypted'):
+        (uploads / name).write_bytes(b'y' * 10)
+    _age(uploads / 'live.decrypted')
+    _age(uploads / 'abc_plain.pdf')
+    _age(uploads / 'live.encrypted')
+
+    report = run_janitor(db, File, StorageUsage, 'uploads', storage['root'])
+
+    assert report['temp_files_removed'] == 1
+    assert report['orphaned_files_removed'] == 1
+    assert report['bytes_reclaimed'] == 20
+    assert report['orphaned_rows_removed'] == 0
+    assert sorted(os.listdir(uploads)) == ['fresh.decrypted', 'live.encrypted']
+    assert db.session.get(File, 'live') is not None
+
+
+def test_removes_row_without_file_and_decrements_usage(storage):
+    for file_id in ('gone', 'kept1', 'kept2'):
+        _add_row(storage, file_id)
+    for file_id in ('kept1', 'kept2'):
+        (storage['uploads'] / f'{file_id}.encrypted').write_bytes(b'z' * 50)
+    db.session.get(StorageUsage, storage['sender'].id).bytes_used = 250
+    db.session.commit()
+
+    report = run_janitor(db, File, StorageUsage, 'uploads', storage['root'])
+
+    assert report['orphaned_rows_removed'] == 1
+    assert db.session.get(File, 'gone') is None
+    assert get_storage_used(StorageUsage, storage['sender'].id) == 200
+
+
+def test_recent_rows_are_not_removed(storage):
+    _add_row(storage, 'uploading', created_at=datetime.utcnow())
+
+    report = run_janitor(db, File, StorageUsage, 'uploads', storage['root'])
+
+    assert report['orphaned_rows_removed'] == 0
+    assert db.session.get(File, 'uploading') is not None
+
+
+def test_missing_upload_folder_deletes_nothing(storage):
+    report = run_janitor(db, File, StorageUsage, 'not-mounted', storage['root'])
+
+    assert report['aborted']
+    assert File.query.count() == 1
+
+
+def test_refuses_mass_row_deletion(storage):
+    # An emptied volume: every file is gone, far more than the floor
+    os.remove(storage['uploads'] / 'live.encrypted')
+    for i in range(MIN_MISSING_ROWS_TO_ABORT + 1):
+        _add_row(storage, f'gone{i}')
+
+    report = run_janitor(db, File, StorageUsage, 'uploads', storage['root'])
+
+    assert report['aborted']
+    assert report['orphaned_rows_removed'] == 0
+    assert File.query.count() == MIN_MISSING_ROWS_TO_ABORT + 2
+
+
+def test_small_deployment_missing_row_is_removed(storage):
+    # The only row has lost its file; a ratio alone would refuse forever
+    os.remove(storage['uploads'] / 'live.encrypted')
+
+    report = run_janitor(db, File, StorageUsage, 'uploads', storage['root'])
+
+    assert report['aborted'] is None
+    assert report['orphaned_rows_removed'] == 1
+    assert File.query.count() == 0
+    assert get_storage_used(StorageUsage, storage['sender'].id) == 0
+
+
+def test_dry_run_changes_nothing(storage):
+    (storage['uploads'] / 'orphan.pdf').write_bytes(b'y' * 10)
+    _age(storage['uploads'] / 'orphan.pdf')
+
+    report = run_janitor(db, File, StorageUsage, 'uploads', storage['root'], dry_run=True)
+
+    assert report['orphaned_files_removed'] == 1
+    assert (storage['uploads'] / 'orphan.pdf').exists()
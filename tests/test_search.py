@@ -0,0 +1,125 @@
+import pytest
+
+from database import db
+from models.chat_room import ChatRoom
+from models.file import File
+from models.message import Message
+from utils.search import create_search_indexes, search_files, search_messages
+from tests.conftest import make_user
+
+
+@pytest.fixture
+def rooms(app):
+    lawyer = make_user('Lawyer', 'lawyer')
+    client = make_user('Client', 'client')
+    other_lawyer = make_user('Other', 'lawyer')
+    other_client = make_user('Stranger', 'client')
+
+    own_room = ChatRoom(lawyer_id=lawyer.id, client_id=client.id)
+    other_room = ChatRoom(lawyer_id=other_lawyer.id, client_id=other_client.id)
+    db.session.add_all([own_room, other_room])
+    db.session.flush()
+
+    # Rows written before the FTS tables exist must still be searchable
+    db.session.add(Message(chat_room_id=own_room.id, sender_id=lawyer.id,
+                           content='Please sign the contract by Friday', signature='s'))
+    db.session.commit()
+    create_search_indexes(db)
+
+    db.session.add(Message(chat_room_id=other_room.id, sender_id=other_lawyer.id,
+                           content='Confidential contract for another matter', signature='s'))
+    db.session.commit()
+    return {'lawyer': lawyer, 'client': client, 'stranger': other_client,
+            'own_room': own_room, 'other_room': other_room}
+
+
+def test_messages_scoped_to_users_rooms(rooms):
+    results, has_more = search_messages(db, Message, rooms['client'].id, 'contract')
+    assert [r['chat_room_id'] for r in results] == [rooms['own_room'].id]
+    assert not has_more
+
+    results, _ = search_messages(db, Message, rooms['stranger'].id, 'contract')
+    assert [r['chat_room_id'] for r in results] == [rooms['other_room'].id]
+
+
+def test_message_pagination_has_more(rooms):
+    for i in range(5):
+        db.session.add(Message(chat_room_id=rooms['own_room'].id, sender_id=rooms['client'].id,
+                               content=f'invoice number {i}', signature='s'))
+    db.session.commit()
+
+    first, has_more = search_messages(db, Message, rooms['lawyer'].id, 'invoice', page=1, per_page=2)
+    assert len(first) == 2 and has_more
+
+    last, has_more = search_messages(db, Message, rooms['lawyer'].id, 'invoice', page=3, per_page=2)
+    assert len(last) == 1 and not has_more
+
+    seen = {r['id'] for page in (1, 2, 3)
+            for r in search_messages(db, Message, rooms['lawyer'].id, 'invoice', page=page, per_page=2)[0]}
+    assert len(seen) == 5
+
+
+@pytest.mark.parametrize('query', ['NEAR(', '"x" OR', 'contract AND', '*', '(', 'col:contract', '"'])
+def test_fts5_syntax_is_escaped(rooms, query):
+    results, _ = search_messages(db, Message, rooms['lawyer'].id, query)
+    assert isinstance(results, list)
+
+
+def test_snippet_is_html_escaped(rooms):
+    db.session.add(Message(chat_room_id=rooms['own_room'].id, sender_id=rooms['client'].id,
+                           content='<script>alert(1)</script> deposition notes', signature='s'))
+    db.session.commit()
+
+    results, _ = search_messages(db, Message, rooms['lawyer'].id, 'deposition')
+    snippet = results[0]['snippet']
+    assert '<script>' not in snippet
+    assert '&lt;script&gt;' in snippet
+    assert '<mark>deposition</mark>' in snippet
+
+
+def test_files_scoped_to_sender_and_recipient(rooms):
+    db.session.add_all([
+        File(id='a', filename='Contract_v2.pdf', file_path='uploads/a', file_size=1,
+             sender_id=rooms['lawyer'].id, recipient_id=rooms['client'].id),
+        File(id='b', filename='contract_secret.pdf', file_path='uploads/b', file_size=1,
+             sender_id=rooms['stranger'].id, recipient_id=rooms['stranger'].id),
+    ])
+    db.session.commit()
+
+    results, _ = search_files(db, File, rooms['client'].id, 'contract')
+    assert [r['id'] for r in results] == ['a']
+    assert results[0]['snippet'].startswith('<mark>Contract</mark>')
+
+
+def test_create_search_indexes_is_idempotent(rooms):
+    create_search_indexes(db)
+    results, _ = search_messages(db, Message, rooms['lawyer'].id, 'contract')
+    assert len(results) == 1
+
+
+def test_results_do_not_lazy_load_users(rooms):
+    from sqlalchemy import event
+
+    for i in range(5):
+        db.session.add(File(id=f'f{i}', filename=f'contract_{i}.pdf', file_path='uploads/x', file_size=1,
+                            sender_id=rooms['lawyer'].id, recipient_id=rooms['client'].id))
+        db.session.add(Message(chat_room_id=rooms['own_room'].id, sender_id=rooms['client'].id,
+                               content=f'contract note {i}', signature='s'))
+    db.session.commit()
+    lawyer_id = rooms['lawyer'].id
+    # Start from an empty identity map so users are not already loaded
+    db.session.expunge_all()
+
+    statements = []
+    engine = db.engine
+    listener = lambda *args: statements.append(args[2])  # noqa: E731
+    event.listen(engine, 'before_cursor_execute', listener)
+    try:
+        files, _ = search_files(db, File, lawyer_id, 'contract')
+        messages, _ = search_messages(db, Message, lawyer_id, 'contract')
+    finally:
+        event.remove(engine, 'before_cursor_execute', listener)
+
+    assert len(files) == 5 and len(messages) == 6
+    # One ranked query plus one fetch per search
+    assert len(statements) == 4
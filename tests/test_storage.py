@@ -0,0 +1,56 @@
+import os
+
+from database import db
+from models.file import File
+from models.storage_usage import StorageUsage
+from utils.encryption import RSAEncryption
+from utils.storage import add_storage_used, get_storage_used, reconcile_storage_usage
+from tests.conftest import make_user
+
+
+def test_add_storage_used_creates_and_updates_counter(app):
+    user = make_user('Lawyer', 'lawyer')
+    add_storage_used(db, StorageUsage, user.id, 100)
+    add_storage_used(db, StorageUsage, user.id, 50)
+    db.session.commit()
+    assert get_storage_used(StorageUsage, user.id) == 150
+
+
+def test_add_storage_used_upserts_a_single_counter(app):
+    user_id = make_user('Lawyer', 'lawyer').id
+    db.session.commit()
+    add_storage_used(db, StorageUsage, user_id, 100)
+    db.session.commit()
+    # The counter row is not in the session, as for another request
+    db.session.expunge_all()
+    add_storage_used(db, StorageUsage, user_id, 40)
+    add_storage_used(db, StorageUsage, user_id, -20)
+    db.session.commit()
+    assert StorageUsage.query.count() == 1
+    assert get_storage_used(StorageUsage, user_id) == 120
+
+
+def test_reconcile_corrects_drift_and_missing_counters(app):
+    lawyer = make_user('Lawyer', 'lawyer')
+    client = make_user('Client', 'client')
+    db.session.add_all([
+        File(id='a', filename='a', file_path='a', file_size=300, sender_id=lawyer.id, recipient_id=client.id),
+        File(id='b', filename='b', file_path='b', file_size=200, sender_id=client.id, recipient_id=lawyer.id),
+        StorageUsage(user_id=lawyer.id, bytes_used=999),
+    ])
+    db.session.commit()
+
+    assert reconcile_storage_usage(db, File, StorageUsage) == 2
+    assert get_storage_used(StorageUsage, lawyer.id) == 300
+    assert get_storage_used(StorageUsage, client.id) == 200
+    assert reconcile_storage_usage(db, File, StorageUsage) == 0
+
+
+def test_encrypted_size_matches_encrypt_file(tmp_path):
+    rsa_encryption = RSAEncryption()
+    _, public_key = rsa_encryption.generate_key_pair()
+    for size in (0, 1, 190, 1000):
+        path = tmp_path / f'plain{size}'
+        path.write_bytes(os.urandom(size))
+        encrypted_path = rsa_encryption.encrypt_file(str(path), public_key)
+        assert rsa_encryption.encrypted_size(size, public_key) == os.path.getsize(encrypted_path)
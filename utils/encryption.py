@@ -5,6 +5,9 @@ import os
 import base64
 
 class RSAEncryption:
+    # RSA can only encrypt data smaller than the key size
+    MAX_CHUNK_SIZE = 190  # For 2048-bit key, max is ~245 bytes, using 190 for safety
+    
     def __init__(self):
         self.backend = default_backend()
     
@@ -56,8 +59,7 @@ class RSAEncryption:
             file_data = f.read()
         
         # For large files, we need to encrypt in chunks
-        # RSA can only encrypt data smaller than the key size
-        max_chunk_size = 190  # For 2048-bit key, max is ~245 bytes, using 190 for safety
+        max_chunk_size = self.MAX_CHUNK_SIZE
         
         encrypted_chunks = []
         for i in range(0, len(file_data), max_chunk_size):
@@ -84,40 +86,85 @@ class RSAEncryption:
         
         return encrypted_file_path
     
-    def decrypt_file(self, encrypted_file_path, private_key_pem):
-        """Decrypt a file using RSA private key"""
-        private_key = self.load_private_key(private_key_pem)
-        
-        # Read encrypted file
+    def encrypted_size(self, plaintext_size, public_key_pem):
+        """Size in bytes of the file encrypt_file would write for this key"""
+        chunk_size = self.load_public_key(public_key_pem).key_size // 8
+        num_chunks = -(-plaintext_size // self.MAX_CHUNK_SIZE)  # ceiling division
+        # Chunk count header, then a length prefix and ciphertext per chunk
+        return 4 + num_chunks * (4 + chunk_size)
+    
+    def _oaep_padding(self):
+        """OAEP padding used for file chunks"""
+        return padding.OAEP(
+            mgf=padding.MGF1(algorithm=hashes.SHA256()),
+            algorithm=hashes.SHA256(),
+            label=None
+        )
+    
+    def _read_encrypted_chunks(self, encrypted_file_path):
+        """Yield the chunk count, then each encrypted chunk of a file"""
         with open(encrypted_file_path, 'rb') as f:
             # Read number of chunks
             num_chunks = int.from_bytes(f.read(4), byteorder='big')
+            yield num_chunks
             
-            decrypted_chunks = []
             for _ in range(num_chunks):
                 # Read chunk length
                 chunk_length = int.from_bytes(f.read(4), byteorder='big')
                 # Read encrypted chunk
-                encrypted_chunk = f.read(chunk_length)
-                
-                # Decrypt chunk
-                decrypted_chunk = private_key.decrypt(
-                    encrypted_chunk,
-                    padding.OAEP(
-                        mgf=padding.MGF1(algorithm=hashes.SHA256()),
-                        algorithm=hashes.SHA256(),
-                        label=None
-                    )
-                )
-                decrypted_chunks.append(decrypted_chunk)
+                yield f.read(chunk_length)
+    
+    def decrypt_file_chunks(self, encrypted_file_path, private_key_pem):
+        """Decrypt a file chunk by chunk without loading it into memory"""
+        private_key = self.load_private_key(private_key_pem)
+        
+        chunks = self._read_encrypted_chunks(encrypted_file_path)
+        next(chunks)  # skip chunk count
+        for encrypted_chunk in chunks:
+            yield private_key.decrypt(encrypted_chunk, self._oaep_padding())
+    
+    def rewrap_file_chunks(self, encrypted_file_path, private_key_pem, public_key_pem):
+        """Re-encrypt a file for another public key, yielding the new file's bytes"""
+        private_key = self.load_private_key(private_key_pem)
+        public_key = self.load_public_key(public_key_pem)
         
-        # Combine decrypted chunks
-        decrypted_data = b''.join(decrypted_chunks)
+        def rewrap(encrypted_chunk):
+            chunk = private_key.decrypt(encrypted_chunk, self._oaep_padding())
+            rewrapped_chunk = public_key.encrypt(chunk, self._oaep_padding())
+            return len(rewrapped_chunk).to_bytes(4, byteorder='big') + rewrapped_chunk
+        
+        chunks = self._read_encrypted_chunks(encrypted_file_path)
+        # Chunks map one to one, so the count header stays the same
+        header = next(chunks).to_bytes(4, byteorder='big')
+        # Yield the header together with the first chunk, so a wrong key
+        # fails before any output is produced
+        first_encrypted_chunk = next(chunks, None)
+        if first_encrypted_chunk is None:
+            yield header
+            return
+        yield header + rewrap(first_encrypted_chunk)
+        for encrypted_chunk in chunks:
+            yield rewrap(encrypted_chunk)
+    
+    def decrypt_file(self, encrypted_file_path, private_key_pem):
+        """Decrypt a file using RSA private key"""
+        chunks = self.decrypt_file_chunks(encrypted_file_path, private_key_pem)
+        # Decrypt the first chunk before creating the output, so a wrong key
+        # fails without leaving an empty file behind
+        first_chunk = next(chunks, b'')
         
         # Save decrypted file
         decrypted_file_path = encrypted_file_path.replace('.encrypted', '.decrypted')
-        with open(decrypted_file_path, 'wb') as f:
-            f.write(decrypted_data)
+        try:
+            with open(decrypted_file_path, 'wb') as f:
+                f.write(first_chunk)
+                for decrypted_chunk in chunks:
+                    f.write(decrypted_chunk)
+        except Exception:
+            # Never leave a partially decrypted file on disk
+            if os.path.exists(decrypted_file_path):
+                os.remove(decrypted_file_path)
+            raise
         
         return decrypted_file_path
 
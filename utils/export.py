@@ -0,0 +1,147 @@
+import json
+import os
+import zipfile
+from datetime import datetime
+
+from utils.encryption import RSAEncryption
+
+FLUSH_THRESHOLD = 64 * 1024  # hand bytes to the response in ~64KB pieces
+MESSAGE_BATCH_SIZE = 500
+
+
+class _StreamBuffer:
+    """Write-only file object that collects zip output until it is drained.
+
+    It has no tell()/seek(), so zipfile writes entries in streaming mode with
+    data descriptors instead of seeking back to patch local headers.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self.size = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        self.size = 0
+        return data
+
+
+def _room_files(File, chat_room):
+    """Files exchanged between the two participants of a chat room"""
+    participants = (chat_room.lawyer_id, chat_room.client_id)
+    return File.query.filter(
+        File.sender_id.in_(participants), File.recipient_id.in_(participants)
+    ).order_by(File.created_at.asc())
+
+
+def stream_chat_export(chat_room, Message, File, rewrap_for=None):
+    """Yield a zip archive of a chat room, its messages and its files.
+
+    The archive is produced incrementally so memory use does not grow with
+    the number of messages or the size of the attachments. Files are
+    decrypted unless ``rewrap_for`` (a User) is given, in which case they are
+    re-encrypted for that user's public key.
+    """
+    buffer = _StreamBuffer()
+    rsa_encryption = RSAEncryption()
+    participants = {user.id: user for user in (chat_room.lawyer, chat_room.client)}
+    message_count = 0
+    exported_files = []
+
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        # Public keys let the recipient verify every signature offline
+        archive.writestr('public_keys.json', json.dumps({
+            str(user.id): {'name': user.name, 'role': user.role, 'public_key': user.public_key}
+            for user in participants.values()
+        }, indent=2))
+
+        messages = Message.query.filter_by(chat_room_id=chat_room.id).order_by(
+            Message.created_at.asc(), Message.id.asc()
+        ).yield_per(MESSAGE_BATCH_SIZE)
+
+        with archive.open('messages.jsonl', 'w', force_zip64=True) as out:
+            for message in messages:
+                record = {
+                    'id': message.id,
+                    'sender_id': message.sender_id,
+                    'sender': participants[message.sender_id].name if message.sender_id in participants else None,
+                    'content': message.content,
+                    'signature': message.signature,
+                    'created_at': message.created_at.isoformat(),
+                }
+                out.write((json.dumps(record) + '\n').encode('utf-8'))
+                message_count += 1
+                if buffer.size >= FLUSH_THRESHOLD:
+                    yield buffer.drain()
+
+        for file_record in _room_files(File, chat_room):
+            if not os.path.exists(file_record.file_path):
+                exported_files.append({'id': file_record.id, 'filename': file_record.filename, 'missing': True})
+                continue
+
+            # Only the recipient's key can open the stored file
+            private_key = file_record.recipient.private_key
+            if rewrap_for is not None:
+                arcname = f'files/{file_record.id}_{file_record.filename}.encrypted'
+                chunks = rsa_encryption.rewrap_file_chunks(
+                    file_record.file_path, private_key, rewrap_for.public_key
+                )
+            else:
+                arcname = f'files/{file_record.id}_{file_record.filename}'
+                chunks = rsa_encryption.decrypt_file_chunks(file_record.file_path, private_key)
+
+            # Headers are already sent, so a bad attachment must not abort the
+            # archive; it is reported in the manifest instead
+            try:
+                # The first chunk is fully decrypted (and re-encrypted when
+                # rewrapping), so a wrong key fails here, before the entry exists
+                first_chunk = next(chunks, b'')
+            except Exception as e:
+                exported_files.append({'id': file_record.id, 'filename': file_record.filename, 'error': str(e) or type(e).__name__})
+                continue
+
+            entry = {
+                'id': file_record.id,
+                'filename': file_record.filename,
+                'path': arcname,
+                'sender_id': file_record.sender_id,
+                'recipient_id': file_record.recipient_id,
+                'created_at': file_record.created_at.isoformat(),
+            }
+            with archive.open(arcname, 'w', force_zip64=True) as out:
+                out.write(first_chunk)
+                try:
+                    for chunk in chunks:
+                        out.write(chunk)
+                        if buffer.size >= FLUSH_THRESHOLD:
+                            yield buffer.drain()
+                except Exception as e:
+                    # Bytes already streamed cannot be taken back; flag the entry
+                    entry['error'] = str(e) or type(e).__name__
+                    entry['truncated'] = True
+
+            exported_files.append(entry)
+
+        archive.writestr('manifest.json', json.dumps({
+            'chat_room_id': chat_room.id,
+            'lawyer_id': chat_room.lawyer_id,
+            'client_id': chat_room.client_id,
+            'created_at': chat_room.created_at.isoformat(),
+            'exported_at': datetime.utcnow().isoformat(),
+            'message_count': message_count,
+            'files': exported_files,
+            'files_encrypted_for': rewrap_for.id if rewrap_for is not None else None,
+            'signature_scheme': 'RSA-PSS SHA-256 over UTF-8 message content, base64 encoded',
+        }, indent=2))
+
+    # Closing the archive writes the central directory
+    yield buffer.drain()
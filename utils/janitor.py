@@ -0,0 +1,115 @@
+import os
+import time
+from datetime import datetime, timedelta
+
+from utils.storage import add_storage_used, reconcile_storage_usage
+
+# Files younger than this may still be in use (an upload being encrypted or
+# a decrypted download still being sent), so they are never touched.
+DEFAULT_STALE_AFTER = 60 * 60
+
+# If more than this share of rows has no file, the storage is far more likely
+# to be missing (e.g. an unmounted volume) than the files deleted one by one.
+# The ratio only applies above a floor, so small deployments still get cleaned.
+MAX_MISSING_ROW_RATIO = 0.5
+MIN_MISSING_ROWS_TO_ABORT = 10
+
+
+def _remove(path, size, dry_run):
+    """Delete a file and return the bytes reclaimed"""
+    if dry_run:
+        return size
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        return 0
+    return size
+
+
+def _resolve(root_path, path):
+    """Absolute path for a stored path, independent of the working directory"""
+    return os.path.abspath(os.path.join(root_path, path))
+
+
+def run_janitor(db, File, StorageUsage, upload_folder, root_path, stale_after=DEFAULT_STALE_AFTER, dry_run=False):
+    """Clean up the upload folder and return a report of what was reclaimed.
+
+    Removes stale ``.decrypted`` download copies, files on disk without a
+    ``File`` row (e.g. plaintext left behind by a failed upload) and ``File``
+    rows whose encrypted file no longer exists, then reconciles the per-user
+    storage counters. Relative paths are resolved against ``root_path``.
+    """
+    report = {
+        'temp_files_removed': 0,
+        'orphaned_files_removed': 0,
+        'orphaned_rows_removed': 0,
+        'counters_corrected': 0,
+        'bytes_reclaimed': 0,
+        'dry_run': dry_run,
+        'aborted': None,
+    }
+
+    upload_folder = _resolve(root_path, upload_folder)
+    try:
+        entries = os.scandir(upload_folder)
+    except OSError as e:
+        # Without the folder every row would look orphaned, so touch nothing
+        report['aborted'] = f'Upload folder is not readable: {e}'
+        return report
+
+    known_paths = {
+        _resolve(root_path, path) for (path,) in db.session.query(File.file_path)
+    }
+    cutoff = time.time() - stale_after
+
+    with entries:
+        for entry in entries:
+            if not entry.is_file(follow_symlinks=False):
+                continue
+
+            path = os.path.abspath(entry.path)
+            if path in known_paths:
+                continue
+
+            stat = entry.stat(follow_symlinks=False)
+            if stat.st_mtime > cutoff:
+                continue
+
+            if entry.name.endswith('.decrypted'):
+                report['temp_files_removed'] += 1
+            else:
+                report['orphaned_files_removed'] += 1
+            report['bytes_reclaimed'] += _remove(path, stat.st_size, dry_run)
+
+    # Rows whose encrypted file is gone can never be downloaded again
+    stale_rows = db.session.query(
+        File.id, File.file_path, File.sender_id, File.file_size
+    ).filter(File.created_at < datetime.utcnow() - timedelta(seconds=stale_after)).all()
+    missing_rows = [
+        (file_id, sender_id, file_size)
+        for file_id, file_path, sender_id, file_size in stale_rows
+        if not os.path.exists(_resolve(root_path, file_path))
+    ]
+
+    if (len(missing_rows) > MIN_MISSING_ROWS_TO_ABORT
+            and len(missing_rows) > len(stale_rows) * MAX_MISSING_ROW_RATIO):
+        report['aborted'] = (
+            f'{len(missing_rows)} of {len(stale_rows)} files are missing from {upload_folder}; '
+            'refusing to delete their rows'
+        )
+    elif dry_run:
+        report['orphaned_rows_removed'] = len(missing_rows)
+    else:
+        for file_id, sender_id, file_size in missing_rows:
+            deleted = File.query.filter_by(id=file_id).delete(synchronize_session=False)
+            # Another janitor may have removed the row already
+            if deleted == 1:
+                add_storage_used(db, StorageUsage, sender_id, -file_size)
+                report['orphaned_rows_removed'] += 1
+        db.session.commit()
+
+    if not dry_run:
+        # Correct any drift in the incrementally maintained counters
+        report['counters_corrected'] = reconcile_storage_usage(db, File, StorageUsage)
+
+    return report
@@ -0,0 +1,236 @@
+from sqlalchemy import text
+from sqlalchemy.orm import joinedload
+from markupsafe import escape
+
+# Highlight markers are private-use code points so they survive HTML escaping
+# of the snippet and can then be swapped for real <mark> tags.
+HIGHLIGHT_START = '\ue000'
+HIGHLIGHT_STOP = '\ue001'
+
+MESSAGE_SEARCH_CONFIG = 'english'
+FILE_SEARCH_CONFIG = 'simple'  # no stemming for file names
+MAX_PER_PAGE = 50
+
+# Stored tsvector columns mean matching and ranking read a precomputed vector
+# instead of re-parsing the text of every candidate row.
+POSTGRES_INDEXES = [
+    "ALTER TABLE messages ADD COLUMN IF NOT EXISTS content_tsv tsvector "
+    f"GENERATED ALWAYS AS (to_tsvector('{MESSAGE_SEARCH_CONFIG}', content)) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_messages_content_tsv ON messages USING gin (content_tsv)",
+    "ALTER TABLE files ADD COLUMN IF NOT EXISTS filename_tsv tsvector "
+    f"GENERATED ALWAYS AS (to_tsvector('{FILE_SEARCH_CONFIG}', filename)) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_files_filename_tsv ON files USING gin (filename_tsv)",
+    "CREATE INDEX IF NOT EXISTS ix_messages_chat_room_id ON messages (chat_room_id)",
+    "CREATE INDEX IF NOT EXISTS ix_chat_rooms_lawyer_id ON chat_rooms (lawyer_id)",
+    "CREATE INDEX IF NOT EXISTS ix_chat_rooms_client_id ON chat_rooms (client_id)",
+    "CREATE INDEX IF NOT EXISTS ix_files_sender_id ON files (sender_id)",
+    "CREATE INDEX IF NOT EXISTS ix_files_recipient_id ON files (recipient_id)",
+]
+
+# SQLite stand-in: external-content FTS5 tables kept in sync with triggers
+SQLITE_INDEXES = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5("
+    "content, content='messages', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS messages_fts_ai AFTER INSERT ON messages BEGIN "
+    "INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content); END",
+    "CREATE TRIGGER IF NOT EXISTS messages_fts_ad AFTER DELETE ON messages BEGIN "
+    "INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content); END",
+    "CREATE TRIGGER IF NOT EXISTS messages_fts_au AFTER UPDATE ON messages BEGIN "
+    "INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content); "
+    "INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content); END",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS files_fts USING fts5("
+    "filename, content='files')",
+    "CREATE TRIGGER IF NOT EXISTS files_fts_ai AFTER INSERT ON files BEGIN "
+    "INSERT INTO files_fts(rowid, filename) VALUES (new.rowid, new.filename); END",
+    "CREATE TRIGGER IF NOT EXISTS files_fts_ad AFTER DELETE ON files BEGIN "
+    "INSERT INTO files_fts(files_fts, rowid, filename) VALUES ('delete', old.rowid, old.filename); END",
+    "CREATE TRIGGER IF NOT EXISTS files_fts_au AFTER UPDATE ON files BEGIN "
+    "INSERT INTO files_fts(files_fts, rowid, filename) VALUES ('delete', old.rowid, old.filename); "
+    "INSERT INTO files_fts(rowid, filename) VALUES (new.rowid, new.filename); END",
+]
+
+# The triggers keep these in sync, so existing rows only need indexing once
+SQLITE_FTS_TABLES = ['messages_fts', 'files_fts']
+
+# The inner query restricts candidates to the user's rooms (bitmap AND of the
+# GIN and chat_room_id indexes) and ranks on the stored vector; ts_headline
+# re-parses the text, so it only runs on the rows of the requested page.
+POSTGRES_MESSAGE_SEARCH = f"""
+    WITH q AS (SELECT websearch_to_tsquery('{MESSAGE_SEARCH_CONFIG}', :query) AS query)
+    SELECT page.id, page.rank,
+           ts_headline('{MESSAGE_SEARCH_CONFIG}', page.content, q.query, :headline) AS snippet
+    FROM (
+        SELECT m.id, m.content, m.created_at, ts_rank_cd(m.content_tsv, q.query) AS rank
+        FROM messages m, q
+        WHERE m.content_tsv @@ q.query
+          AND m.chat_room_id IN (
+              SELECT id FROM chat_rooms WHERE lawyer_id = :user_id OR client_id = :user_id
+          )
+        ORDER BY rank DESC, m.created_at DESC
+        LIMIT :limit OFFSET :offset
+    ) AS page, q
+    ORDER BY page.rank DESC, page.created_at DESC
+"""
+
+POSTGRES_FILE_SEARCH = f"""
+    WITH q AS (SELECT websearch_to_tsquery('{FILE_SEARCH_CONFIG}', :query) AS query)
+    SELECT page.id, page.rank,
+           ts_headline('{FILE_SEARCH_CONFIG}', page.filename, q.query, :headline) AS snippet
+    FROM (
+        SELECT f.id, f.filename, f.created_at, ts_rank_cd(f.filename_tsv, q.query) AS rank
+        FROM files f, q
+        WHERE f.filename_tsv @@ q.query
+          AND (f.sender_id = :user_id OR f.recipient_id = :user_id)
+        ORDER BY rank DESC, f.created_at DESC
+        LIMIT :limit OFFSET :offset
+    ) AS page, q
+    ORDER BY page.rank DESC, page.created_at DESC
+"""
+
+SQLITE_MESSAGE_SEARCH = """
+    SELECT m.id, -bm25(messages_fts) AS rank,
+           snippet(messages_fts, 0, :start, :stop, '...', 16) AS snippet
+    FROM messages_fts
+    JOIN messages m ON m.id = messages_fts.rowid
+    JOIN chat_rooms r ON r.id = m.chat_room_id
+    WHERE messages_fts MATCH :query
+      AND (r.lawyer_id = :user_id OR r.client_id = :user_id)
+    ORDER BY bm25(messages_fts), m.created_at DESC
+    LIMIT :limit OFFSET :offset
+"""
+
+SQLITE_FILE_SEARCH = """
+    SELECT f.id, -bm25(files_fts) AS rank,
+           snippet(files_fts, 0, :start, :stop, '...', 16) AS snippet
+    FROM files_fts
+    JOIN files f ON f.rowid = files_fts.rowid
+    WHERE files_fts MATCH :query
+      AND (f.sender_id = :user_id OR f.recipient_id = :user_id)
+    ORDER BY bm25(files_fts), f.created_at DESC
+    LIMIT :limit OFFSET :offset
+"""
+
+
+def create_search_indexes(db):
+    """Create full-text search indexes for the current database dialect"""
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        for statement in POSTGRES_INDEXES:
+            db.session.execute(text(statement))
+    elif dialect == 'sqlite':
+        existing = {
+            name for (name,) in db.session.execute(
+                text("SELECT name FROM sqlite_master WHERE type = 'table'")
+            )
+        }
+        for statement in SQLITE_INDEXES:
+            db.session.execute(text(statement))
+        for table in SQLITE_FTS_TABLES:
+            if table not in existing:
+                db.session.execute(text(f"INSERT INTO {table}({table}) VALUES ('rebuild')"))
+    else:
+        return
+
+    db.session.commit()
+
+
+def _sqlite_match_query(query):
+    """Quote each term so user input is never parsed as FTS5 syntax"""
+    terms = ['"%s"' % term.replace('"', '""') for term in query.split()]
+    return ' '.join(terms)
+
+
+def _highlight(snippet):
+    """HTML-escape a snippet and turn the highlight markers into <mark> tags"""
+    return (
+        str(escape(snippet or ''))
+        .replace(HIGHLIGHT_START, '<mark>')
+        .replace(HIGHLIGHT_STOP, '</mark>')
+    )
+
+
+def _run_search(db, postgres_sql, sqlite_sql, user_id, query, page, per_page):
+    """Run a ranked search and return (rows, has_more) for one page"""
+    params = {
+        'user_id': user_id,
+        'limit': per_page + 1,  # one extra row tells us if there is a next page
+        'offset': (page - 1) * per_page,
+    }
+
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        sql = postgres_sql
+        params['query'] = query
+        params['headline'] = (
+            f'StartSel="{HIGHLIGHT_START}", StopSel="{HIGHLIGHT_STOP}", '
+            'MaxWords=20, MinWords=5, MaxFragments=2'
+        )
+    elif dialect == 'sqlite':
+        sql = sqlite_sql
+        params['query'] = _sqlite_match_query(query)
+        params['start'] = HIGHLIGHT_START
+        params['stop'] = HIGHLIGHT_STOP
+    else:
+        raise NotImplementedError(f'Full-text search is not supported on {dialect}')
+
+    rows = db.session.execute(text(sql), params).fetchall()
+    return rows[:per_page], len(rows) > per_page
+
+
+def search_messages(db, Message, user_id, query, page=1, per_page=20):
+    """Search messages in the chat rooms the user belongs to"""
+    rows, has_more = _run_search(
+        db, POSTGRES_MESSAGE_SEARCH, SQLITE_MESSAGE_SEARCH, user_id, query, page, per_page
+    )
+    if not rows:
+        return [], has_more
+
+    # Load senders in the same query rather than one lazy load per result
+    messages = {
+        m.id: m for m in Message.query.options(joinedload(Message.sender))
+        .filter(Message.id.in_([row.id for row in rows]))
+    }
+
+    results = []
+    for row in rows:
+        message = messages[row.id]
+        results.append({
+            'id': message.id,
+            'chat_room_id': message.chat_room_id,
+            'sender': message.sender.name,
+            'sender_id': message.sender_id,
+            'timestamp': message.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+            'rank': float(row.rank),
+            'snippet': _highlight(row.snippet),
+        })
+    return results, has_more
+
+
+def search_files(db, File, user_id, query, page=1, per_page=20):
+    """Search names of files the user sent or received"""
+    rows, has_more = _run_search(
+        db, POSTGRES_FILE_SEARCH, SQLITE_FILE_SEARCH, user_id, query, page, per_page
+    )
+    if not rows:
+        return [], has_more
+
+    # Load senders and recipients in the same query rather than lazily per result
+    files = {
+        f.id: f for f in File.query.options(joinedload(File.sender), joinedload(File.recipient))
+        .filter(File.id.in_([row.id for row in rows]))
+    }
+
+    results = []
+    for row in rows:
+        file_record = files[row.id]
+        results.append({
+            'id': file_record.id,
+            'filename': file_record.filename,
+            'sender': file_record.sender.name,
+            'recipient': file_record.recipient.name,
+            'file_size': file_record.file_size,
+            'timestamp': file_record.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+            'rank': float(row.rank),
+            'snippet': _highlight(row.snippet),
+        })
+    return results, has_more
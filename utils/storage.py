@@ -0,0 +1,64 @@
+from datetime import datetime
+
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+
+def _upsert(db, StorageUsage):
+    """INSERT ... ON CONFLICT statement for the current database dialect"""
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        return postgresql.insert(StorageUsage)
+    if dialect == 'sqlite':
+        return sqlite.insert(StorageUsage)
+    raise NotImplementedError(f'Storage accounting is not supported on {dialect}')
+
+
+def get_storage_used(StorageUsage, user_id):
+    """Return the bytes currently charged to a user"""
+    usage = StorageUsage.query.get(user_id)
+    return usage.bytes_used if usage else 0
+
+
+def add_storage_used(db, StorageUsage, user_id, delta):
+    """Atomically adjust a user's usage counter; the caller commits"""
+    # A single upsert, so two concurrent first uploads cannot both insert
+    statement = _upsert(db, StorageUsage).values(user_id=user_id, bytes_used=max(delta, 0))
+    db.session.execute(statement.on_conflict_do_update(
+        index_elements=[StorageUsage.user_id],
+        set_={'bytes_used': StorageUsage.bytes_used + delta, 'updated_at': datetime.utcnow()}
+    ))
+
+
+def reconcile_storage_usage(db, File, StorageUsage):
+    """Rebuild every usage counter from the files table, returning the number corrected"""
+    # Lock the counters first: uploads that already bumped a counter have then
+    # committed their File row, and new uploads wait until we are done
+    db.session.query(StorageUsage.user_id).order_by(StorageUsage.user_id).with_for_update().all()
+    
+    # Compute and apply the correction in one statement
+    total = (
+        select(func.coalesce(func.sum(File.file_size), 0))
+        .where(File.sender_id == StorageUsage.user_id)
+        .scalar_subquery()
+    )
+    corrected = db.session.execute(
+        update(StorageUsage)
+        .where(StorageUsage.bytes_used != total)
+        .values(bytes_used=total)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    
+    # Users with files but no counter row yet. A concurrent first upload may
+    # create the row meanwhile; it is left alone and checked on the next run
+    missing = db.session.execute(
+        _upsert(db, StorageUsage).from_select(
+            ['user_id', 'bytes_used'],
+            select(File.sender_id, func.sum(File.file_size))
+            .where(File.sender_id.not_in(select(StorageUsage.user_id)))
+            .group_by(File.sender_id)
+        ).on_conflict_do_nothing(index_elements=[StorageUsage.user_id])
+    ).rowcount
+    
+    db.session.commit()
+    return corrected + missing